@@ -0,0 +1,155 @@
+"""
+Контроль нагрузки для маршрутов с bcrypt (~250 мс CPU на хэш/проверку).
+
+- ограничитель параллельности с ограниченной очередью: лишние запросы
+  сразу получают 503, а не занимают потоки, нужные остальным маршрутам;
+- token bucket в памяти по IP и по аккаунту: при превышении — 429.
+Оба ответа содержат заголовок Retry-After.
+
+Лимит по IP считается по client_ip(). За балансировщиком request.client —
+адрес самого балансировщика, а X-Forwarded-For клиент может заполнить сам:
+каждый прокси дописывает адрес справа. Поэтому доверяем только
+TRUSTED_PROXY_HOPS записям справа (на Heroku — 1, см. Procfile).
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from fastapi import HTTPException, Request, status
+import math
+import os
+import threading
+import time
+
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', PASSWORD_HASH_CONCURRENCY * 2))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', '2'))
+
+# Сколько прокси перед приложением дописывают X-Forwarded-For; 0 — заголовок игнорируется
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000'))
+# (ёмкость, пополнение в секунду): по IP — 20 запросов/мин, по аккаунту — 5 попыток/мин
+IP_RATE = (20, 20 / 60)
+ACCOUNT_RATE = (5, 5 / 60)
+
+
+class TokenBuckets:
+    """
+    Набор token bucket по ключу. Хранит не больше max_keys ключей,
+    при переполнении вытесняет давно не использованные
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # ключ -> (токены, время последнего пополнения)
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """
+        Забирает токен. Возвращает 0, если запрос разрешён,
+        иначе — через сколько секунд появится следующий токен
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / self.refill_per_second
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Не больше max_concurrent одновременных хэширований и не больше
+    max_queue ожидающих; ожидание слота ограничено wait_seconds
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, wait_seconds: float):
+        self.max_queue = max_queue
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def _overloaded(self):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": str(math.ceil(self.wait_seconds))},
+        )
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    raise self._overloaded()
+                self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.wait_seconds)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                raise self._overloaded()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+password_hashing = ConcurrencyLimiter(
+    PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_QUEUE, PASSWORD_HASH_WAIT_SECONDS
+)
+ip_buckets = TokenBuckets(*IP_RATE)
+account_buckets = TokenBuckets(*ACCOUNT_RATE)
+
+
+def _raise_if_limited(buckets: TokenBuckets, key: str):
+    retry_after = buckets.take(key)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def client_ip(request: Request) -> str:
+    """
+    Адрес клиента: запись X-Forwarded-For, дописанная самым дальним доверенным
+    прокси. Всё левее неё прислал сам клиент и может быть подделано
+    """
+    host = request.client.host if request.client else "unknown"
+    if TRUSTED_PROXY_HOPS <= 0:
+        return host
+    forwarded = [
+        entry.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for entry in header.split(",")
+        if entry.strip()
+    ]
+    if not forwarded:
+        return host
+    # Записей меньше, чем прокси, — все они дописаны доверенными прокси
+    return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+
+
+def limit_ip(request: Request):
+    """
+    Зависимость FastAPI: ограничение частоты запросов с одного IP
+    """
+    _raise_if_limited(ip_buckets, client_ip(request))
+
+
+def limit_account(account: str):
+    """
+    Ограничение частоты попыток для одного аккаунта (email, логин админа, id)
+    """
+    _raise_if_limited(account_buckets, str(account).lower())
@@ -0,0 +1,16 @@
+import database
+import payments_archive
+
+def archive_payments():
+    db = database.SessionLocal()
+    try:
+        months = payments_archive.archive_closed_months(db)
+    finally:
+        db.close()
+    if months:
+        print(f"Заархивированы месяцы: {', '.join(months)}")
+    else:
+        print("Нет закрытых месяцев для архивации")
+
+if __name__ == "__main__":
+    archive_payments()
@@ -0,0 +1,128 @@
+"""
+Бенчмарк: задержка чтения каталога и пользователей при параллельных оплатах.
+
+shared — как было: rollback-журнал, один движок для чтения и записи;
+wal    — WAL, но по-прежнему один движок (эффект WAL отдельно от маршрутизации);
+routed — WAL + отдельное read-only соединение (get_read_db).
+Разница wal/routed — вклад именно отдельного движка чтения.
+Писатели работают в отдельных процессах, читатели — потоки основного процесса;
+читателей больше, чем соединений в пуле (5), как в threadpool uvicorn.
+
+Запуск: python bench_read_routing.py [секунд на режим]
+"""
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+TMP_DIR = tempfile.mkdtemp(prefix='bench_read_routing_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP_DIR, 'routed.db')}"
+os.environ.pop('DATABASE_READ_URL', None)
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+import database, models, models_user, crud, schemas
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+WRITERS = 4
+READERS = 20
+USERS = 50
+POINTS = 500
+
+
+def seed(Session):
+    db = Session()
+    for i in range(USERS):
+        db.add(models_user.User(name=f'user{i}', email=f'user{i}@bench', password_hash='-',
+                                bonus_balance=0.0, total_volume=0.0))
+    for i in range(POINTS):
+        db.add(models.WaterPoint(name=f'point{i}', latitude=54.7, longitude=55.9))
+    db.commit()
+    db.close()
+
+
+def single_engine_db(name, wal):
+    url = f"sqlite:///{os.path.join(TMP_DIR, name)}"
+    engine = database.create_write_engine(url, wal=wal)
+    database.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(Session)
+    return url, Session
+
+
+def writer(url, wal, stop, payments, write_errors):
+    # Отдельный процесс со своим движком: писатели не делят GIL с читателями
+    Session = sessionmaker(autocommit=False, autoflush=False,
+                           bind=database.create_write_engine(url, wal=wal))
+    while not stop.is_set():
+        db = Session()
+        try:
+            crud.make_payment(db, schemas.PaymentCreate(
+                user_id=random.randint(1, USERS), water_point_id=random.randint(1, POINTS),
+                volume=20, amount=10, payment_method='card', timestamp=''
+            ))
+            with payments.get_lock():
+                payments.value += 1
+        except OperationalError:
+            db.rollback()
+            with write_errors.get_lock():
+                write_errors.value += 1
+        finally:
+            db.close()
+
+
+def run(name, url, wal, ReadSession):
+    stop = multiprocessing.Event()
+    payments = multiprocessing.Value('i', 0)
+    write_errors = multiprocessing.Value('i', 0)
+    latencies = []
+    counters = {'read_errors': 0}
+    lock = threading.Lock()
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = ReadSession()
+            try:
+                crud.get_all_water_points(db, limit=100)
+                crud.get_user(db, random.randint(1, USERS))
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except OperationalError:
+                with lock:
+                    counters['read_errors'] += 1
+            finally:
+                db.close()
+
+    workers = [multiprocessing.Process(target=writer, args=(url, wal, stop, payments, write_errors))
+               for _ in range(WRITERS)]
+    workers += [threading.Thread(target=reader) for _ in range(READERS)]
+    for worker in workers:
+        worker.start()
+    time.sleep(DURATION)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    ms = sorted(x * 1000 for x in latencies)
+    quantiles = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+    print(f"{name:>7}: reads={len(ms)} p50={quantiles[49]:.2f}ms p95={quantiles[94]:.2f}ms "
+          f"p99={quantiles[98]:.2f}ms max={ms[-1] if ms else 0:.2f}ms "
+          f"payments/s={payments.value / DURATION:.0f} "
+          f"read_errors={counters['read_errors']} write_errors={write_errors.value}")
+
+
+if __name__ == "__main__":
+    shared_url, SharedSession = single_engine_db('shared.db', wal=False)
+    wal_url, WalSession = single_engine_db('wal.db', wal=True)
+    seed(database.SessionLocal)
+
+    print(f"{WRITERS} writers (/pay), {READERS} readers (GET), {DURATION:g}s per mode, data in {TMP_DIR}")
+    run('shared', shared_url, False, SharedSession)
+    run('wal', wal_url, True, WalSession)
+    run('routed', database.DATABASE_URL, True, database.ReadSessionLocal)
@@ -1,10 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, and_, func, text
 import models, schemas
 import models_user
-from typing import Optional, List
+import payments_archive
+from typing import Optional, List, Tuple
 from datetime import datetime
-from passlib.hash import bcrypt
+import base64
+import json
+
+USER_SORT_FIELDS = ("id", "bonus_balance", "total_volume")
+# Начиная с этого размера таблицы /users/count отдаёт оценку вместо COUNT(*)
+USER_COUNT_ESTIMATE_THRESHOLD = 100_000
 
 def get_all_water_points(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.WaterPoint).offset(skip).limit(limit).all()
@@ -71,12 +77,14 @@ def search_water_points(
     
     return search.offset(skip).limit(limit).all()
 
-def create_user_with_password(db: Session, user: schemas.UserCreate):
-    hashed_password = bcrypt.hash(user.password)
+def create_user_with_password(db: Session, user: schemas.UserCreate, password_hash: str):
+    """
+    Создать пользователя; пароль хэшируется вызывающим кодом (под admission.password_hashing)
+    """
     db_user = models_user.User(
         name=user.name,
         email=user.email,
-        password_hash=hashed_password,
+        password_hash=password_hash,
         bonus_balance=0.0,  # Явно задаём дефолт
         total_volume=0.0    # Явно задаём дефолт
     )
@@ -88,12 +96,138 @@ def create_user_with_password(db: Session, user: schemas.UserCreate):
 def get_user(db: Session, user_id: int):
     return db.query(models_user.User).filter(models_user.User.id == user_id).first()
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(models_user.User).filter(models_user.User.email == email).first()
-    if user and bcrypt.verify(password, user.password_hash):
-        return user
+def encode_user_cursor(value, user_id: int) -> str:
+    raw = json.dumps([value, user_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def decode_user_cursor(cursor: str, sort: str = "id"):
+    """
+    Разбирает курсор вида [значение_сортировки, id]. ValueError — если курсор
+    битый или значение не подходит к полю сортировки
+    """
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        raise ValueError("invalid cursor")
+    if sort == "id" and value != user_id:
+        raise ValueError("invalid cursor")
+    if not _is_number(value):
+        raise ValueError("invalid cursor")
+    return value, user_id
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Наименьшая строка, большая всех строк с данным префиксом: последний
+    символ увеличивается на единицу (U+10FFFF отбрасывается, суррогаты
+    пропускаются). None — верхней границы нет
+    """
+    chars = list(prefix)
+    while chars:
+        code = ord(chars.pop()) + 1
+        if code > 0x10FFFF:
+            continue
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000
+        return "".join(chars) + chr(code)
     return None
 
+def _user_prefix_filter(search, query: str, dialect: str):
+    # Диапазон [query, следующий префикс) вместо LIKE 'query%' — так индексы
+    # по name и email используются на любой СУБД (поиск чувствителен к регистру).
+    # Диапазон равен поиску по префиксу только при побайтовом сравнении строк:
+    # в SQLite это BINARY по умолчанию, в PostgreSQL нужен COLLATE "C"
+    # (для него в models_user есть отдельные индексы)
+    User = models_user.User
+    upper = prefix_upper_bound(query)
+    conditions = []
+    for column in (User.name, User.email):
+        if dialect == "postgresql":
+            column = column.collate("C")
+        condition = column >= query
+        if upper is not None:
+            condition = and_(condition, column < upper)
+        conditions.append(condition)
+    return search.filter(or_(*conditions))
+
+def get_users_page(
+    db: Session,
+    query: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> Tuple[List[models_user.User], Optional[str]]:
+    """
+    Курсорная (keyset) пагинация пользователей: сортировка по (sort, id),
+    следующая страница начинается строго после последней записи предыдущей
+    """
+    if sort not in USER_SORT_FIELDS:
+        raise ValueError(f"sort must be one of {USER_SORT_FIELDS}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    User = models_user.User
+    column = getattr(User, sort)
+    search = db.query(User)
+    if query:
+        search = _user_prefix_filter(search, query, db.bind.dialect.name)
+
+    if cursor:
+        value, last_id = decode_user_cursor(cursor, sort)
+        if sort == "id":
+            search = search.filter(User.id > last_id if order == "asc" else User.id < last_id)
+        elif order == "asc":
+            search = search.filter(or_(column > value, and_(column == value, User.id > last_id)))
+        else:
+            search = search.filter(or_(column < value, and_(column == value, User.id < last_id)))
+
+    if sort == "id":
+        ordering = [User.id.asc() if order == "asc" else User.id.desc()]
+    elif order == "asc":
+        ordering = [column.asc(), User.id.asc()]
+    else:
+        ordering = [column.desc(), User.id.desc()]
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    users = search.order_by(*ordering).limit(limit + 1).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last = users[-1]
+        next_cursor = encode_user_cursor(getattr(last, sort), last.id)
+    return users, next_cursor
+
+def _estimate_user_count(db: Session) -> Optional[int]:
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'users'")
+        ).scalar()
+    # Для SQLite и прочих: max(id) берётся из индекса первичного ключа за O(log n),
+    # но завышает количество на число удалённых записей
+    return db.query(func.max(models_user.User.id)).scalar()
+
+def count_users(db: Session, query: Optional[str] = None, exact: bool = False) -> Tuple[int, bool]:
+    """
+    Количество пользователей. Без фильтра на больших таблицах возвращает
+    дешёвую оценку; второй элемент — признак того, что значение приблизительное
+    """
+    if not query and not exact:
+        estimate = _estimate_user_count(db)
+        if estimate is not None and estimate >= USER_COUNT_ESTIMATE_THRESHOLD:
+            return int(estimate), True
+    search = db.query(func.count(models_user.User.id))
+    if query:
+        search = _user_prefix_filter(search, query, db.bind.dialect.name)
+    return search.scalar(), False
+
+def get_user_by_email(db: Session, email: str):
+    return db.query(models_user.User).filter(models_user.User.email == email).first()
+
 def make_payment(db: Session, payment: schemas.PaymentCreate):
     user = db.query(models_user.User).filter(models_user.User.id == payment.user_id).first()
     if not user:
@@ -132,4 +266,7 @@ def make_payment(db: Session, payment: schemas.PaymentCreate):
     return db_payment
 
 def get_payments_by_user(db: Session, user_id: int):
-    return db.query(models.Payment).filter(models.Payment.user_id == user_id).all()
+    """
+    История оплат: закрытые месяцы из архива, текущий — из таблицы payments
+    """
+    return payments_archive.read_payments(db, user_id=user_id)
@@ -1,10 +1,58 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from pathlib import Path
+import sqlite3
 import os
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./waterpoints.db')
+# Реплика для чтения; если не задана и база SQLite — тот же файл в режиме только чтения
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _sqlite_file(url: str):
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or parsed.database in (None, '', ':memory:'):
+        return None
+    return parsed.database
+
+
+def create_write_engine(url: str, wal: bool = True):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    if wal and _sqlite_file(url):
+        # WAL: читатели не ждут пишущую транзакцию и не блокируют её
+        @event.listens_for(engine, "connect")
+        def _enable_wal(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    return engine
+
+
+def create_read_engine(url: str, read_url=None):
+    """
+    Движок для GET-запросов. None — отдельного движка нет, читаем через основной
+    """
+    if read_url:
+        connect_args = {"check_same_thread": False} if _sqlite_file(read_url) else {}
+        return create_engine(read_url, connect_args=connect_args)
+    path = _sqlite_file(url)
+    if path is None:
+        return None
+    uri = Path(path).resolve().as_uri() + '?mode=ro'
+
+    def connect():
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only=ON")
+        return connection
+
+    # URL 'sqlite://' SQLAlchemy считает базой в памяти и выбирает SingletonThreadPool,
+    # который закрывает соединения, ещё занятые другими потоками, — пул задаём явно
+    return create_engine('sqlite://', creator=connect, poolclass=QueuePool)
+
+
+engine = create_write_engine(DATABASE_URL)
+read_engine = create_read_engine(DATABASE_URL, DATABASE_READ_URL) or engine
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
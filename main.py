@@ -1,8 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-import models, schemas, crud, database
+import models, schemas, crud, database, admission
 from typing import Optional, List
 from models_user import User as UserModel
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -14,7 +14,10 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import Column, Integer, String, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
+from collections import OrderedDict
 import os
+import threading
+import time
 
 Base = getattr(models, 'Base', declarative_base())
 
@@ -44,6 +47,50 @@ def get_db():
     finally:
         db.close()
 
+# Сколько секунд после своей записи клиент читает с основной базы (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+_recent_writers = OrderedDict()  # клиент -> время последней успешной записи
+_recent_writers_lock = threading.Lock()
+
+def _client_keys(request: Request) -> List[str]:
+    # Запись учитывается и по IP, и по токену: админка платит с токеном,
+    # а баланс и историю потом читает без него
+    keys = ["ip:" + admission.client_ip(request)]
+    authorization = request.headers.get("authorization")
+    if authorization:
+        keys.append("auth:" + authorization)
+    return keys
+
+@app.middleware("http")
+async def remember_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        now = time.monotonic()
+        with _recent_writers_lock:
+            for key in _client_keys(request):
+                _recent_writers.pop(key, None)
+                _recent_writers[key] = now
+            # Записи упорядочены по времени — устаревшие всегда в начале
+            while _recent_writers and next(iter(_recent_writers.values())) < now - READ_YOUR_WRITES_SECONDS:
+                _recent_writers.popitem(last=False)
+    return response
+
+def get_read_db(request: Request):
+    """
+    Сессия для чтения: реплика/read-only соединение, но основная база,
+    если этот клиент только что что-то изменил
+    """
+    with _recent_writers_lock:
+        writes = [_recent_writers[key] for key in _client_keys(request) if key in _recent_writers]
+    if writes and time.monotonic() - max(writes) < READ_YOUR_WRITES_SECONDS:
+        db = database.SessionLocal()
+    else:
+        db = database.ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -93,10 +140,14 @@ def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = Depends
         raise credentials_exception
     return admin
 
-@app.post("/admin-login")
+@app.post("/admin-login", dependencies=[Depends(admission.limit_ip)])
 def admin_login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    admission.limit_account(f"admin:{form_data.username}")
     admin = db.query(Admin).filter(Admin.username == form_data.username).first()
-    if not admin or not bcrypt.verify(form_data.password, admin.password_hash):
+    if admin:
+        with admission.password_hashing.slot():
+            password_ok = bcrypt.verify(form_data.password, admin.password_hash)
+    if not admin or not password_ok:
         raise HTTPException(status_code=401, detail="Incorrect admin username or password")
     access_token = create_access_token(data={"sub": admin.username, "is_admin": True})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -113,7 +164,7 @@ async def admin_panel(request: Request):
 def get_water_points(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить список всех точек забора воды с пагинацией
@@ -129,7 +180,7 @@ def search_water_points(
     min_rating: Optional[float] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Поиск точек забора воды по различным критериям
@@ -141,7 +192,7 @@ def search_water_points(
     )
 
 @app.get("/water-points/{point_id}", response_model=schemas.WaterPoint)
-def get_water_point(point_id: int, db: Session = Depends(get_db)):
+def get_water_point(point_id: int, db: Session = Depends(get_read_db)):
     """
     Получить информацию о конкретной точке забора воды по ID
     """
@@ -184,15 +235,29 @@ def delete_water_point(point_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Точка не найдена")
     return {"message": "Точка успешно удалена"}
 
-@app.post("/users", response_model=schemas.User)
+@app.post("/users", response_model=schemas.User, dependencies=[Depends(admission.limit_ip)])
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     Создать пользователя
     """
-    return crud.create_user_with_password(db, user)
+    with admission.password_hashing.slot():
+        password_hash = bcrypt.hash(user.password)
+    return crud.create_user_with_password(db, user, password_hash)
+
+@app.get("/users/count", response_model=schemas.UserCount)
+def get_users_count(
+    query: Optional[str] = None,
+    exact: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Количество пользователей (для больших таблиц без фильтра — оценка)
+    """
+    count, estimated = crud.count_users(db, query=query, exact=exact)
+    return {"count": count, "estimated": estimated}
 
 @app.get("/users/{user_id}", response_model=schemas.User)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db)):
     """
     Получить пользователя по ID
     """
@@ -201,14 +266,30 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return db_user
 
-@app.get("/users", response_model=List[schemas.User])
-def get_users(db: Session = Depends(get_db)):
+@app.get("/users", response_model=schemas.UserPage)
+def get_users(
+    query: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
     """
-    Получить список всех пользователей
+    Список пользователей постранично: поиск по началу имени/email,
+    сортировка по id, bonus_balance или total_volume. Для следующей
+    страницы передайте next_cursor из предыдущего ответа
     """
-    return db.query(UserModel).all()
+    try:
+        users, next_cursor = crud.get_users_page(
+            db, query=query, sort=sort, order=order,
+            cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"items": users, "next_cursor": next_cursor}
 
-@app.put("/users/{user_id}", response_model=schemas.User)
+@app.put("/users/{user_id}", response_model=schemas.User, dependencies=[Depends(admission.limit_ip)])
 def update_user(user_id: int, user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     Обновить данные пользователя (имя, email, пароль)
@@ -225,7 +306,9 @@ def update_user(user_id: int, user: schemas.UserCreate, db: Session = Depends(ge
     db_user.name = user.name
     db_user.email = user.email
     if user.password:
-        db_user.password_hash = bcrypt.hash(user.password)
+        admission.limit_account(f"user:{user_id}")
+        with admission.password_hashing.slot():
+            db_user.password_hash = bcrypt.hash(user.password)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -313,22 +396,28 @@ def make_payment(
     return db_payment
 
 @app.get("/users/{user_id}/payments", response_model=List[schemas.Payment])
-def get_payments(user_id: int, db: Session = Depends(get_db)):
+def get_payments(user_id: int, db: Session = Depends(get_read_db)):
     """
     Получить историю оплат пользователя
     """
     return crud.get_payments_by_user(db, user_id)
 
-@app.post("/register", response_model=schemas.User)
+@app.post("/register", response_model=schemas.User, dependencies=[Depends(admission.limit_ip)])
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if db.query(UserModel).filter(UserModel.email == user.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user_with_password(db, user)
+    with admission.password_hashing.slot():
+        password_hash = bcrypt.hash(user.password)
+    return crud.create_user_with_password(db, user, password_hash)
 
-@app.post("/login")
+@app.post("/login", dependencies=[Depends(admission.limit_ip)])
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    admission.limit_account(f"login:{form_data.username}")
+    user = crud.get_user_by_email(db, form_data.username)
+    if user:
+        with admission.password_hashing.slot():
+            password_ok = bcrypt.verify(form_data.password, user.password_hash)
+    if not user or not password_ok:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     # Добавляем id пользователя в токен
     access_token = create_access_token(data={"sub": user.email, "id": user.id})
@@ -344,7 +433,7 @@ class AdminCreateRequest(BaseModel):
     username: str
     password: str
 
-@app.post("/admin-create")
+@app.post("/admin-create", dependencies=[Depends(admission.limit_ip)])
 def admin_create(data: AdminCreateRequest, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     inspector = inspect(db.bind)
     if not inspector.has_table('admins'):
@@ -369,7 +458,9 @@ def admin_create(data: AdminCreateRequest, db: Session = Depends(get_db), token:
         if db.query(Admin).filter(Admin.username == data.username).first():
             raise HTTPException(status_code=400, detail="Admin with this username already exists")
         db.query(Admin).delete()
-        db.add(Admin(username=data.username, password_hash=bcrypt.hash(data.password)))
+        with admission.password_hashing.slot():
+            password_hash = bcrypt.hash(data.password)
+        db.add(Admin(username=data.username, password_hash=password_hash))
         db.commit()
         return {"message": "Admin account created/updated successfully"}
 
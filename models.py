@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from database import engine
@@ -32,7 +32,16 @@ class Payment(Base):
     payment_method = Column(String, nullable=False)  # Способ оплаты: cash, card, bonus
     bonus_used = Column(Float, default=0)  # Сколько бонусов потрачено
     bonus_earned = Column(Float, default=0)  # Сколько бонусов начислено
-    timestamp = Column(String, nullable=False)
+    timestamp = Column(String, nullable=False, index=True)  # ISO-формат; по нему режутся месяцы архива
+
+    __table_args__ = (
+        Index("ix_payments_user_id_timestamp", "user_id", "timestamp"),
+    )
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
+
+# create_all не добавляет индексы в уже существующие таблицы — досоздаём их
+for table in (User.__table__, Payment.__table__):
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
@@ -1,12 +1,21 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 from database import Base
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)  # Индекс для поиска по префиксу
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)  # Хэш пароля
     bonus_balance = Column(Float, default=0)  # Баллы (литры)
     total_volume = Column(Float, default=0)   # Всего куплено литров
     # Можно добавить phone и т.д. при необходимости
+
+    # Составные индексы для курсорной пагинации с сортировкой (значение, id)
+    __table_args__ = (
+        Index("ix_users_bonus_balance_id", "bonus_balance", "id"),
+        Index("ix_users_total_volume_id", "total_volume", "id"),
+        # Поиск по префиксу в PostgreSQL сравнивает строки в COLLATE "C"
+        Index("ix_users_name_c", name.collate("C")).ddl_if(dialect="postgresql"),
+        Index("ix_users_email_c", email.collate("C")).ddl_if(dialect="postgresql"),
+    )
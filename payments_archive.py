@@ -0,0 +1,153 @@
+"""
+Холодный архив оплат: закрытые месяцы переносятся из таблицы payments
+в сжатые Parquet-файлы (по одному файлу на месяц), горячая таблица
+хранит только текущий месяц.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime
+from typing import Optional, List
+import pandas as pd
+import os
+import models
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.getenv('PAYMENTS_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive', 'payments'))
+
+# Размер пачки id в DELETE ... IN: SQLite ограничивает число параметров запроса
+DELETE_BATCH_SIZE = 500
+
+PAYMENT_COLUMNS = [
+    'id', 'user_id', 'water_point_id', 'volume', 'amount',
+    'payment_method', 'bonus_used', 'bonus_earned', 'timestamp'
+]
+
+
+def month_path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f'payments_{month}.parquet')
+
+
+def archived_months() -> List[str]:
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        name[len('payments_'):-len('.parquet')]
+        for name in os.listdir(ARCHIVE_DIR)
+        if name.startswith('payments_') and name.endswith('.parquet')
+    )
+
+
+def _next_month(month: str) -> str:
+    year, mon = map(int, month.split('-'))
+    year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f'{year:04d}-{mon:02d}'
+
+
+def archive_closed_months(db: Session, now: Optional[datetime] = None) -> List[str]:
+    """
+    Переносит оплаты всех месяцев до текущего в архив и удаляет их из БД.
+    Возвращает месяцы (YYYY-MM), в которых что-то изменилось
+    """
+    # timestamp хранится строкой в ISO-формате, поэтому сравнение строк = сравнение дат
+    cutoff = (now or datetime.now()).strftime('%Y-%m')
+    month_expr = func.substr(models.Payment.timestamp, 1, 7)
+    months = [
+        row[0] for row in
+        db.query(month_expr).filter(models.Payment.timestamp < cutoff).distinct().order_by(month_expr)
+    ]
+    # SQLite без AUTOINCREMENT выдаёт новым строкам max(id) + 1: если удалить
+    # строку с максимальным id, новые оплаты получат id уже лежащих в архиве.
+    # Поэтому она остаётся в таблице (и в файле) до следующего запуска
+    max_id = db.query(func.max(models.Payment.id)).scalar()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    changed = []
+    for month in months:
+        in_month = (
+            (models.Payment.timestamp >= month)
+            & (models.Payment.timestamp < _next_month(month))
+        )
+        frame = pd.read_sql(
+            db.query(*[getattr(models.Payment, c) for c in PAYMENT_COLUMNS]).filter(in_month).statement,
+            db.bind
+        )
+        # Удалять можно только прочитанные строки: оплата, закоммиченная в этот месяц
+        # после чтения, в файл не попала и останется до следующего запуска
+        read_ids = [int(i) for i in frame['id'] if i != max_id]
+        path = month_path(month)
+        if os.path.exists(path):
+            # Строки, уже лежащие в файле (например, удержанная max_id), повторно не пишем
+            archived = pd.read_parquet(path)
+            frame = frame[~frame['id'].isin(archived['id'])]
+            if not frame.empty:
+                # Поздние оплаты задним числом дописываются к уже закрытому месяцу
+                frame = pd.concat([archived, frame])
+            written = not frame.empty
+        else:
+            written = True
+        if written:
+            # Сортировка по user_id: статистика row group'ов отсекает лишнее при чтении
+            frame = frame.sort_values(['user_id', 'id'])
+            tmp_path = path + '.tmp'
+            frame.to_parquet(tmp_path, compression='zstd', index=False)
+            os.replace(tmp_path, path)
+        # Файл записан — только теперь удаляем строки из горячей таблицы
+        deleted = 0
+        for start in range(0, len(read_ids), DELETE_BATCH_SIZE):
+            deleted += (
+                db.query(models.Payment)
+                .filter(models.Payment.id.in_(read_ids[start:start + DELETE_BATCH_SIZE]))
+                .delete(synchronize_session=False)
+            )
+        db.commit()
+        if written or deleted:
+            changed.append(month)
+    return changed
+
+
+def _read_archived_payments(
+    user_id: Optional[int] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> List[dict]:
+    """
+    Оплаты из архива за месяцы [start_month, end_month] (YYYY-MM, включительно).
+    Может содержать строки, которые ещё лежат в таблице, — снаружи читать через read_payments
+    """
+    filters = [('user_id', '==', user_id)] if user_id is not None else None
+    records = []
+    for month in archived_months():
+        if start_month and month < start_month:
+            continue
+        if end_month and month > end_month:
+            continue
+        frame = pd.read_parquet(month_path(month), columns=PAYMENT_COLUMNS, filters=filters)
+        records.extend(frame.sort_values('id').to_dict('records'))
+    return records
+
+
+def read_payments(
+    db: Session,
+    user_id: Optional[int] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> List[models.Payment]:
+    """
+    Оплаты из архива и из таблицы payments за месяцы [start_month, end_month].
+    Строка с max(id) намеренно лежит в обоих местах (как и строки прерванного
+    запуска) — такие дубли отбрасываются, побеждает версия из таблицы
+    """
+    hot = db.query(models.Payment)
+    if user_id is not None:
+        hot = hot.filter(models.Payment.user_id == user_id)
+    if start_month:
+        hot = hot.filter(models.Payment.timestamp >= start_month)
+    if end_month:
+        hot = hot.filter(models.Payment.timestamp < _next_month(end_month))
+    hot = hot.order_by(models.Payment.id).all()
+    hot_ids = {p.id for p in hot}
+    cold = [
+        models.Payment(**row)
+        for row in _read_archived_payments(user_id, start_month, end_month)
+        if row['id'] not in hot_ids
+    ]
+    return cold + hot
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 class WaterPointBase(BaseModel):
     name: str
@@ -43,6 +43,14 @@ class User(UserBase):
     class Config:
         orm_mode = True
 
+class UserPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None  # None — страниц больше нет
+
+class UserCount(BaseModel):
+    count: int
+    estimated: bool = False  # True — приблизительное значение для больших таблиц
+
 class PaymentBase(BaseModel):
     user_id: int
     water_point_id: int
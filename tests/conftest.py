@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+# База и архив тестов — во временном каталоге; задаём до импорта модулей приложения
+TMP_DIR = tempfile.mkdtemp(prefix='watermap_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP_DIR, 'test.db')}"
+os.environ['PAYMENTS_ARCHIVE_DIR'] = os.path.join(TMP_DIR, 'archive')
+os.environ.pop('DATABASE_READ_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+import database, models, main
+
+# Таблица admins иначе создаётся только в startup-обработчике приложения
+database.Base.metadata.create_all(bind=database.engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    yield
+    db = database.SessionLocal()
+    try:
+        for table in reversed(database.Base.metadata.sorted_tables):
+            db.execute(table.delete())
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
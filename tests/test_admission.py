@@ -0,0 +1,79 @@
+from fastapi.testclient import TestClient
+import pytest
+import admission
+import main
+
+
+@pytest.fixture(autouse=True)
+def reset_buckets():
+    admission.ip_buckets = admission.TokenBuckets(*admission.IP_RATE)
+    admission.account_buckets = admission.TokenBuckets(*admission.ACCOUNT_RATE)
+
+
+def failed_login(client, account):
+    return client.post('/login', data={'username': account, 'password': 'wrong'})
+
+
+def test_ip_bucket_exhausted_returns_429():
+    with TestClient(main.app, client=('10.0.0.1', 1000)) as client:
+        codes = [failed_login(client, f'user{i}@test').status_code
+                 for i in range(admission.IP_RATE[0] + 1)]
+    assert codes[:-1] == [401] * admission.IP_RATE[0]
+    assert codes[-1] == 429
+
+
+def test_different_ips_get_separate_buckets():
+    with TestClient(main.app, client=('10.0.0.1', 1000)) as client:
+        for i in range(admission.IP_RATE[0]):
+            failed_login(client, f'user{i}@test')
+        response = failed_login(client, 'last@test')
+        assert response.status_code == 429
+        assert 'retry-after' in response.headers
+    with TestClient(main.app, client=('10.0.0.2', 1000)) as client:
+        assert failed_login(client, 'other@test').status_code == 401
+
+
+def login_via_router(client, forwarded_for, account='x@test'):
+    # Роутер Heroku дописывает настоящий адрес клиента справа
+    return client.post('/login', data={'username': account, 'password': 'wrong'},
+                       headers={'X-Forwarded-For': forwarded_for})
+
+
+def test_forged_forwarded_for_lands_in_real_client_bucket(monkeypatch):
+    monkeypatch.setattr(admission, 'TRUSTED_PROXY_HOPS', 1)
+    with TestClient(main.app, client=('10.1.1.1', 1000)) as client:
+        codes = [login_via_router(client, f'1.2.3.{i}, 203.0.113.9', f'user{i}@test').status_code
+                 for i in range(admission.IP_RATE[0] + 1)]
+        assert codes[-1] == 429
+        # Другой настоящий клиент за тем же роутером — свой лимит
+        assert login_via_router(client, '1.2.3.4, 203.0.113.10').status_code == 401
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(admission, 'TRUSTED_PROXY_HOPS', 0)
+    with TestClient(main.app, client=('10.0.0.1', 1000)) as client:
+        codes = [login_via_router(client, f'203.0.113.{i}', f'user{i}@test').status_code
+                 for i in range(admission.IP_RATE[0] + 1)]
+    assert codes[-1] == 429
+
+
+def test_hashing_slot_is_not_held_during_db_work(client, monkeypatch):
+    import crud
+    held = []
+
+    def create_user(db, user, password_hash):
+        # Во время записи в БД все слоты хэширования должны быть свободны
+        acquired = admission.password_hashing._slots.acquire(blocking=False)
+        held.append(not acquired)
+        if acquired:
+            admission.password_hashing._slots.release()
+        return original(db, user, password_hash)
+
+    original = crud.create_user_with_password
+    monkeypatch.setattr(admission, 'password_hashing', admission.ConcurrencyLimiter(1, 0, 0.1))
+    monkeypatch.setattr(crud, 'create_user_with_password', create_user)
+    response = client.post('/register', json={'name': 'a', 'email': 'a@test', 'password': 'secret'})
+    assert response.status_code == 200
+    assert held == [False]
+    assert client.post('/login', data={'username': 'a@test', 'password': 'secret'}).status_code == 200
+    assert client.post('/login', data={'username': 'a@test', 'password': 'bad'}).status_code == 401
@@ -0,0 +1,109 @@
+from datetime import datetime
+import os
+
+import pytest
+
+import crud
+import models
+import payments_archive
+
+NOW = datetime(2026, 10, 19)
+
+
+@pytest.fixture(autouse=True)
+def clean_archive():
+    yield
+    for month in payments_archive.archived_months():
+        os.remove(payments_archive.month_path(month))
+
+
+def add_payment(db, user_id, timestamp):
+    payment = models.Payment(user_id=user_id, water_point_id=1, volume=20, amount=10,
+                             payment_method='card', bonus_used=0, bonus_earned=5, timestamp=timestamp)
+    db.add(payment)
+    db.commit()
+    return payment.id
+
+
+def test_history_merges_archive_and_hot_rows(db):
+    ids = [
+        add_payment(db, 1, '2026-08-03T10:00:00'),
+        add_payment(db, 2, '2026-08-04T10:00:00'),
+        add_payment(db, 1, '2026-09-05T10:00:00'),
+        add_payment(db, 1, '2026-10-02T10:00:00'),
+    ]
+
+    assert payments_archive.archive_closed_months(db, now=NOW) == ['2026-08', '2026-09']
+    assert payments_archive.archived_months() == ['2026-08', '2026-09']
+    assert [p.id for p in db.query(models.Payment).order_by(models.Payment.id)] == [ids[3]]
+
+    history = crud.get_payments_by_user(db, 1)
+    assert [p.id for p in history] == [ids[0], ids[2], ids[3]]
+    assert [p.timestamp for p in history][0] == '2026-08-03T10:00:00'
+    assert [p.id for p in crud.get_payments_by_user(db, 2)] == [ids[1]]
+
+
+def test_max_id_row_is_kept_without_rewriting_its_month(db):
+    first = add_payment(db, 1, '2026-09-01T10:00:00')
+    last = add_payment(db, 1, '2026-09-30T10:00:00')
+
+    assert payments_archive.archive_closed_months(db, now=NOW) == ['2026-09']
+    # Строка с max(id) остаётся в таблице, чтобы SQLite не выдал её id повторно
+    assert [p.id for p in db.query(models.Payment)] == [last]
+    assert [p.id for p in crud.get_payments_by_user(db, 1)] == [first, last]
+
+    path = payments_archive.month_path('2026-09')
+    mtime = os.stat(path).st_mtime_ns
+    assert payments_archive.archive_closed_months(db, now=NOW) == []
+    assert os.stat(path).st_mtime_ns == mtime
+
+    newer = add_payment(db, 1, '2026-10-01T10:00:00')
+    assert newer > last
+    assert payments_archive.archive_closed_months(db, now=NOW) == ['2026-09']
+    assert [p.id for p in crud.get_payments_by_user(db, 1)] == [first, last, newer]
+
+
+def test_row_committed_during_run_is_not_lost(db, monkeypatch):
+    import database
+    add_payment(db, 1, '2026-09-10T10:00:00')
+    add_payment(db, 1, '2026-10-01T10:00:00')
+    original_read_sql = payments_archive.pd.read_sql
+    late = {}
+
+    def read_sql_then_pay(*args, **kwargs):
+        frame = original_read_sql(*args, **kwargs)
+        # /pay в 23:59:59 коммитится, пока задача уже прочитала месяц
+        other = database.SessionLocal()
+        late['id'] = add_payment(other, 1, '2026-09-30T23:59:59.9')
+        other.close()
+        return frame
+
+    monkeypatch.setattr(payments_archive.pd, 'read_sql', read_sql_then_pay)
+    payments_archive.archive_closed_months(db, now=NOW)
+    monkeypatch.setattr(payments_archive.pd, 'read_sql', original_read_sql)
+
+    assert late['id'] in [p.id for p in db.query(models.Payment)]
+    assert late['id'] in [p.id for p in crud.get_payments_by_user(db, 1)]
+    # Следующий запуск архивирует опоздавшую строку
+    add_payment(db, 1, '2026-10-02T10:00:00')
+    payments_archive.archive_closed_months(db, now=NOW)
+    archived = payments_archive._read_archived_payments(user_id=1)
+    assert late['id'] in [row['id'] for row in archived]
+    assert late['id'] not in [p.id for p in db.query(models.Payment)]
+
+
+def test_read_payments_counts_max_id_row_once(db):
+    ids = [
+        add_payment(db, 1, '2026-08-10T10:00:00'),
+        add_payment(db, 2, '2026-09-10T10:00:00'),
+        add_payment(db, 1, '2026-09-20T10:00:00'),
+    ]
+    payments_archive.archive_closed_months(db, now=NOW)
+    # Строка с max(id) и в таблице, и в файле
+    assert ids[2] in [row['id'] for row in payments_archive._read_archived_payments()]
+    assert [p.id for p in db.query(models.Payment)] == [ids[2]]
+
+    assert sorted(p.id for p in payments_archive.read_payments(db)) == ids
+    september = payments_archive.read_payments(db, start_month='2026-09', end_month='2026-09')
+    assert sorted(p.id for p in september) == ids[1:]
+    assert sum(p.amount for p in payments_archive.read_payments(db, user_id=1)) == 20
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import crud
+import database
+import models
+import models_user
+
+
+def test_read_engine_is_read_only_and_pooled():
+    assert database.read_engine is not database.engine
+    # sqlite:// без файла дал бы SingletonThreadPool, который закрывает чужие соединения
+    assert type(database.read_engine.pool).__name__ == 'QueuePool'
+    with database.read_engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA query_only').scalar() == 1
+
+
+def test_concurrent_reads(db):
+    for i in range(20):
+        db.add(models_user.User(name=f'user{i}', email=f'user{i}@test', password_hash='-',
+                                bonus_balance=0.0, total_volume=0.0))
+        db.add(models.WaterPoint(name=f'point{i}', latitude=54.7, longitude=55.9))
+    db.commit()
+
+    def read(i):
+        for _ in range(50):
+            session = database.ReadSessionLocal()
+            try:
+                assert len(crud.get_all_water_points(session, limit=100)) == 20
+                assert crud.get_user(session, i % 20 + 1) is not None
+            finally:
+                session.close()
+
+    # Больше потоков, чем соединений в пуле — как в threadpool uvicorn
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        list(pool.map(read, range(20)))
+
+
+def test_pay_with_token_then_read_without_it_sees_own_write(db, monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import sqlite3
+    import main
+
+    user = models_user.User(name='buyer', email='buyer@test', password_hash='-',
+                            bonus_balance=0.0, total_volume=0.0)
+    db.add(user)
+    db.add(models.WaterPoint(id=1, name='point', latitude=54.7, longitude=55.9))
+    db.commit()
+
+    # Отстающая реплика — снимок базы до оплаты
+    replica_path = tmp_path / 'replica.db'
+    primary = sqlite3.connect(database.engine.url.database)
+    replica = sqlite3.connect(replica_path)
+    primary.backup(replica)
+    primary.close()
+    replica.close()
+    replica_engine = create_engine(f'sqlite:///{replica_path}', connect_args={'check_same_thread': False})
+    monkeypatch.setattr(database, 'ReadSessionLocal', sessionmaker(bind=replica_engine))
+    main._recent_writers.clear()
+
+    token = main.create_access_token({'sub': user.email, 'id': user.id})
+    with TestClient(main.app, client=('10.0.0.1', 1000)) as client:
+        # Как в админке: оплата с токеном, чтение баланса и истории — без него
+        response = client.post('/pay', headers={'Authorization': f'Bearer {token}'}, json={
+            'user_id': user.id, 'water_point_id': 1, 'volume': 20, 'amount': 10,
+            'payment_method': 'card', 'timestamp': '2026-10-19T10:00:00'
+        })
+        assert response.status_code == 200
+        assert client.get(f'/users/{user.id}').json()['total_volume'] == 20
+        assert len(client.get(f'/users/{user.id}/payments').json()) == 1
+
+    # Клиент, который ничего не писал, читает с реплики
+    with TestClient(main.app, client=('10.0.0.2', 1000)) as client:
+        assert client.get(f'/users/{user.id}').json()['total_volume'] == 0
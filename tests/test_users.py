@@ -0,0 +1,62 @@
+import base64
+import json
+
+import models_user
+
+
+def make_cursor(value, user_id):
+    return base64.urlsafe_b64encode(json.dumps([value, user_id]).encode()).decode()
+
+
+def add_users(db, count):
+    for i in range(count):
+        db.add(models_user.User(name=f'user{i}', email=f'user{i}@test', password_hash='-',
+                                bonus_balance=float(i % 3), total_volume=float(i)))
+    db.commit()
+
+
+def test_pages_cover_all_users_once(client, db):
+    add_users(db, 7)
+    params = {'sort': 'bonus_balance', 'order': 'desc', 'limit': 3}
+    page = client.get('/users', params=params).json()
+    seen = [u['id'] for u in page['items']]
+    while page['next_cursor']:
+        page = client.get('/users', params={**params, 'cursor': page['next_cursor']}).json()
+        seen += [u['id'] for u in page['items']]
+    assert sorted(seen) == sorted(set(seen))
+    assert len(seen) == 7
+
+
+def test_cursor_value_must_match_sort(client, db):
+    add_users(db, 2)
+    for sort, cursor in [
+        ('bonus_balance', make_cursor([1, 2], 1)),
+        ('total_volume', make_cursor({'a': 1}, 1)),
+        ('bonus_balance', make_cursor(True, 1)),
+        ('id', make_cursor(5, 1)),
+        ('id', make_cursor(1, '1')),
+    ]:
+        response = client.get('/users', params={'sort': sort, 'cursor': cursor})
+        assert response.status_code == 400, (sort, cursor)
+
+
+def test_prefix_search_matches_non_ascii_names(client, db):
+    for i, name in enumerate(['ab😀', 'ab\U0010ffff', 'abc', 'ac', 'Иван', 'Иванов', 'Ия']):
+        db.add(models_user.User(name=name, email=f'{i}@test', password_hash='-',
+                                bonus_balance=0.0, total_volume=0.0))
+    db.commit()
+
+    def names(query):
+        return sorted(u['name'] for u in client.get('/users', params={'query': query}).json()['items'])
+
+    assert names('ab') == sorted(['ab😀', 'ab\U0010ffff', 'abc'])
+    assert names('Ив') == ['Иван', 'Иванов']
+    assert client.get('/users/count', params={'query': 'ab'}).json()['count'] == 3
+
+
+def test_prefix_upper_bound():
+    import crud
+    assert crud.prefix_upper_bound('ab') == 'ac'
+    assert crud.prefix_upper_bound('a\U0010ffff') == 'b'
+    assert crud.prefix_upper_bound('\U0010ffff') is None
+    assert crud.prefix_upper_bound('a퟿') == 'a'